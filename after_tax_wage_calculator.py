@@ -1,7 +1,9 @@
 #! python3
 # -*- coding: utf-8 -*-
 
-import sys
+import bisect
+import itertools
+import math
 
 
 class SocialInsurance:
@@ -9,6 +11,8 @@ class SocialInsurance:
     五险
     """
 
+    __slots__ = ('min', 'max', 'ratio', 'coupon')
+
     def __init__(self, lower_bound, upper_bound, ratio, coupon):
         """
         :param lower_bound: 缴费基数下限，inclusive
@@ -27,6 +31,8 @@ class HousingFund:
     一金
     """
 
+    __slots__ = ('min', 'max', 'ratio', 'coupon')
+
     def __init__(self, lower_bound, upper_bound, ratio, coupon):
         """
         :param lower_bound: 月缴存额下限，inclusive
@@ -60,7 +66,12 @@ class TaxableWageCalculator:
         SocialInsurance(SOCIAL_INSURANCE_LOWER_BOUND, SOCIAL_INSURANCE_UPPER_BOUND,
                         0.005, 0)
     ]
-    SOCIAL_INSURANCE_PERSONAL = [SOCIAL_INSURANCE_PERSONAL_PER_MONTH] * 12
+
+    # 社保个人缴费各项的缴费基数下限、缴费基数上限、缴费比例、其他扣除费用
+    SOCIAL_INSURANCE_PERSONAL_LOWER_BOUNDS = tuple(si.min for si in SOCIAL_INSURANCE_PERSONAL_PER_MONTH)
+    SOCIAL_INSURANCE_PERSONAL_UPPER_BOUNDS = tuple(si.max for si in SOCIAL_INSURANCE_PERSONAL_PER_MONTH)
+    SOCIAL_INSURANCE_PERSONAL_RATIOS = tuple(si.ratio for si in SOCIAL_INSURANCE_PERSONAL_PER_MONTH)
+    SOCIAL_INSURANCE_PERSONAL_COUPONS = tuple(si.coupon for si in SOCIAL_INSURANCE_PERSONAL_PER_MONTH)
 
     # 社保单位缴费
     SOCIAL_INSURANCE_COMPANY_PER_MONTH = [
@@ -77,7 +88,6 @@ class TaxableWageCalculator:
         SocialInsurance(SOCIAL_INSURANCE_LOWER_BOUND, SOCIAL_INSURANCE_UPPER_BOUND,
                         0.0016, 0)
     ]
-    SOCIAL_INSURANCE_COMPANY = [SOCIAL_INSURANCE_COMPANY_PER_MONTH] * 12
 
     # 住房公积金
     # 数据来源：https://www.shgjj.com/html/newxxgk/zcwj/gfxwj/215343.html
@@ -89,11 +99,9 @@ class TaxableWageCalculator:
 
     # 住房公积金个人缴费
     HOUSING_FUND_PERSONAL_PER_MONTH = HousingFund(HOUSING_FUND_LOWER_BOUND, HOUSING_FUND_UPPER_BOUND, 0.07, 0)
-    HOUSING_FUND_PERSONAL = [HOUSING_FUND_PERSONAL_PER_MONTH] * 12
 
     # 住房公积金单位缴费
     HOUSING_FUND_COMPANY_PER_MONTH = HousingFund(HOUSING_FUND_LOWER_BOUND, HOUSING_FUND_UPPER_BOUND, 0.07, 0)
-    HOUSING_FUND_COMPANY = [HOUSING_FUND_COMPANY_PER_MONTH] * 12
 
     @classmethod
     def get_taxable_wages(cls, gross_wages, social_insurance_bases, housing_fund_bases):
@@ -103,45 +111,47 @@ class TaxableWageCalculator:
         :param housing_fund_bases: 一金缴存基数（默认与 gross_wages 一样）
         :return: 应税收入
         """
-        size = len(gross_wages)
-        assert size == 12 and len(social_insurance_bases) == size and len(housing_fund_bases) == size
-        taxable_wages = []
-        for i in range(0, size):
-
-            # 税前列支
-            pre_tax_deduction_personal = 0
-
-            # 五险
-            social_insurance_base = social_insurance_bases[i]
-            social_insurance_personal = cls.SOCIAL_INSURANCE_PERSONAL[i]
-            for j in range(0, len(social_insurance_personal)):
-                temp = social_insurance_base - social_insurance_personal[j].coupon
-                if temp < social_insurance_personal[j].min:
-                    temp = social_insurance_personal[j].min
-                elif temp > social_insurance_personal[j].max:
-                    temp = social_insurance_personal[j].max
-                pre_tax_deduction_personal += temp * social_insurance_personal[j].ratio
-
-            # 一金
-            housing_fund_base = housing_fund_bases[i]
-            housing_fund_personal = cls.HOUSING_FUND_PERSONAL[i]
-            temp = housing_fund_base * housing_fund_personal.ratio
-            if temp < housing_fund_personal.min:
-                pre_tax_deduction_personal += housing_fund_personal.min
-            elif temp > housing_fund_personal.max:
-                pre_tax_deduction_personal += housing_fund_personal.max
-            else:
-                pre_tax_deduction_personal += temp
-
-            gross_wage = gross_wages[i]
-            if gross_wage - pre_tax_deduction_personal < 0:
+        if len(gross_wages) != 12 or len(social_insurance_bases) != 12 or len(housing_fund_bases) != 12:
+            raise ValueError('expected length-12 gross_wages, social_insurance_bases and housing_fund_bases')
+
+        # 税前列支
+        pre_tax_deductions_personal = list(map(cls.get_pre_tax_deduction_personal,
+                                               social_insurance_bases, housing_fund_bases))
+        for gross_wage, pre_tax_deduction_personal in zip(gross_wages, pre_tax_deductions_personal):
+            if gross_wage < pre_tax_deduction_personal:
                 raise ValueError('gross_wage {} less than pre_tax_deduction_personal {}'
                                  .format(gross_wage, pre_tax_deduction_personal))
-            taxable_wages.append(gross_wage - pre_tax_deduction_personal)
-        return taxable_wages
+        return [gross_wage - pre_tax_deduction_personal
+                for gross_wage, pre_tax_deduction_personal in zip(gross_wages, pre_tax_deductions_personal)]
+
+    @classmethod
+    def get_pre_tax_deduction_personal(cls, social_insurance_base, housing_fund_base):
+        """
+        :param social_insurance_base: 五险缴费基数
+        :param housing_fund_base: 一金缴存基数
+        :return: 税前列支（五险一金个人缴纳部分）
+        """
+        pre_tax_deduction_personal = 0
+
+        # 五险
+        for lower_bound, upper_bound, ratio, coupon in zip(cls.SOCIAL_INSURANCE_PERSONAL_LOWER_BOUNDS,
+                                                           cls.SOCIAL_INSURANCE_PERSONAL_UPPER_BOUNDS,
+                                                           cls.SOCIAL_INSURANCE_PERSONAL_RATIOS,
+                                                           cls.SOCIAL_INSURANCE_PERSONAL_COUPONS):
+            temp = min(upper_bound, max(lower_bound, social_insurance_base - coupon))
+            pre_tax_deduction_personal += temp * ratio
+
+        # 一金
+        housing_fund_personal = cls.HOUSING_FUND_PERSONAL_PER_MONTH
+        temp = housing_fund_base * housing_fund_personal.ratio
+        pre_tax_deduction_personal += max(housing_fund_personal.min, min(housing_fund_personal.max, temp))
+
+        return pre_tax_deduction_personal
 
 
 class TaxRatio:
+    __slots__ = ('min', 'max', 'ratio', 'coupon')
+
     def __init__(self, lower_bound, upper_bound, ratio, coupon):
         """
         :param lower_bound: 应纳税所得额下限，exclusive
@@ -166,11 +176,17 @@ class AfterTaxWageCalculator:
                            TaxRatio(300000, 420000, .25, 31920),
                            TaxRatio(420000, 660000, .3, 52920),
                            TaxRatio(660000, 960000, .35, 85920),
-                           TaxRatio(960000, sys.maxsize, .45, 181920)]
-    TAX_RATIO = [TAX_RATIO_PER_MONTH] * 12
+                           TaxRatio(960000, math.inf, .45, 181920)]
+
+    # 税率表各级应纳税所得额上限、税率、速算扣除数，供 get_tax_ratio 二分查找
+    TAX_RATIO_UPPER_BOUNDS = tuple(tax_ratio.max for tax_ratio in TAX_RATIO_PER_MONTH)
+    TAX_RATIO_RATIOS = tuple(tax_ratio.ratio for tax_ratio in TAX_RATIO_PER_MONTH)
+    TAX_RATIO_COUPONS = tuple(tax_ratio.coupon for tax_ratio in TAX_RATIO_PER_MONTH)
 
     # 应税收入中，全月各项免税、减除、扣除费用（如减除费用、专项扣除等）
-    WAGE_FREE_OF_TAX = [5000] * 12
+    WAGE_FREE_OF_TAX_PER_MONTH = 5000
+    # 各月累计各项免税、减除、扣除费用
+    ACCUMULATED_WAGES_FREE_OF_TAX = tuple(itertools.accumulate(itertools.repeat(WAGE_FREE_OF_TAX_PER_MONTH, 12)))
 
     @classmethod
     def get_after_tax_wages(cls, taxable_wages, tax_bases):
@@ -180,42 +196,79 @@ class AfterTaxWageCalculator:
         :return: 税后工资
         """
         size = len(taxable_wages)
-        assert size == 12 and len(tax_bases) == size
-        after_tax_wages = []
-        accumulated_taxable_wage = 0  # 累计收入
-        accumulated_wage_free_of_tax = 0  # 累计各项免税、减除、扣除费用
-        accumulated_tax_amount_paid = 0  # 累计已缴税额
-        for i in range(0, size):
-
-            # 累计收入与扣除详情
-            tax_base = tax_bases[i]
-            accumulated_taxable_wage += tax_base
-            accumulated_wage_free_of_tax += cls.WAGE_FREE_OF_TAX[i]
-            accumulated_net_taxable_wage = accumulated_taxable_wage - accumulated_wage_free_of_tax  # 累计应纳税所得额
-            if accumulated_net_taxable_wage < 0:
-                accumulated_net_taxable_wage = 0
-
-            # 税款计算
-            tax_ratio = cls.get_tax_ratio(i, accumulated_net_taxable_wage)
-            ratio = tax_ratio.ratio  # 税率
-            coupon = tax_ratio.coupon  # 速算扣除数
-            accumulated_tax_amount_payable = accumulated_net_taxable_wage * ratio - coupon  # 累计应纳税额
-            current_tax_amount = accumulated_tax_amount_payable - accumulated_tax_amount_paid  # 本期申报税额
+        if size != 12 or len(tax_bases) != 12:
+            raise ValueError('expected length-12 taxable_wages and tax_bases')
+
+        # 累计收入与扣除详情
+        accumulated_taxable_wages = itertools.accumulate(tax_bases)  # 累计收入
+        # 累计应纳税所得额
+        accumulated_net_taxable_wages = [max(accumulated_taxable_wage - accumulated_wage_free_of_tax, 0)
+                                         for accumulated_taxable_wage, accumulated_wage_free_of_tax
+                                         in zip(accumulated_taxable_wages, cls.ACCUMULATED_WAGES_FREE_OF_TAX)]
+
+        # 税款计算
+        tax_ratios = map(cls.get_tax_ratio, range(0, size), accumulated_net_taxable_wages)  # （税率, 速算扣除数）
+        # 累计应纳税额
+        accumulated_tax_amounts_payable = [accumulated_net_taxable_wage * ratio - coupon
+                                           for accumulated_net_taxable_wage, (ratio, coupon)
+                                           in zip(accumulated_net_taxable_wages, tax_ratios)]
+        # 本期申报税额 = 累计应纳税额 - 累计已缴税额
+        current_tax_amounts = [accumulated_tax_amount_payable - accumulated_tax_amount_paid
+                               for accumulated_tax_amount_paid, accumulated_tax_amount_payable
+                               in zip([0] + accumulated_tax_amounts_payable, accumulated_tax_amounts_payable)]
+        for i, current_tax_amount in enumerate(current_tax_amounts):
             if current_tax_amount < 0:
                 raise ValueError('month {} current_tax_amount {} less than 0'.format(i, current_tax_amount))
 
-            taxable_wage = taxable_wages[i]
-            after_tax_wages.append(taxable_wage - current_tax_amount)
-            accumulated_tax_amount_paid = accumulated_tax_amount_payable
-        return after_tax_wages
+        return [taxable_wage - current_tax_amount
+                for taxable_wage, current_tax_amount in zip(taxable_wages, current_tax_amounts)]
+
+    @classmethod
+    def get_after_tax_wages_from_gross_wages(cls, gross_wages, social_insurance_bases, housing_fund_bases,
+                                             tax_bases=None):
+        """
+        :param gross_wages: 税前工资
+        :param social_insurance_bases: 五险缴费基数（默认与 gross_wages 一样）
+        :param housing_fund_bases: 一金缴存基数（默认与 gross_wages 一样）
+        :param tax_bases: 个人所得税实际缴税基数（默认与应税收入一样）
+        :return: 税后工资
+        """
+        taxable_wages = TaxableWageCalculator.get_taxable_wages(gross_wages, social_insurance_bases,
+                                                                housing_fund_bases)
+        return cls.get_after_tax_wages(taxable_wages, taxable_wages if tax_bases is None else tax_bases)
+
+    @classmethod
+    def get_total_after_tax_wage(cls, gross_wage_per_month):
+        """
+        每月税前工资相同（五险一金缴费基数、个人所得税缴税基数均与税前工资一样）时，全年税后工资之和。
+        此时各月本期申报税额之和即为第 12 个月的累计应纳税额，无需逐月计算。
+
+        :param gross_wage_per_month: 每月税前工资
+        :return: 全年税后工资
+        """
+        pre_tax_deduction_personal = TaxableWageCalculator.get_pre_tax_deduction_personal(gross_wage_per_month,
+                                                                                          gross_wage_per_month)
+        if gross_wage_per_month < pre_tax_deduction_personal:
+            raise ValueError('gross_wage {} less than pre_tax_deduction_personal {}'
+                             .format(gross_wage_per_month, pre_tax_deduction_personal))
+        total_taxable_wage = (gross_wage_per_month - pre_tax_deduction_personal) * 12  # 全年应税收入
+        net_taxable_wage = max(total_taxable_wage - cls.ACCUMULATED_WAGES_FREE_OF_TAX[-1], 0)  # 全年应纳税所得额
+        ratio, coupon = cls.get_tax_ratio(11, net_taxable_wage)
+        return total_taxable_wage - (net_taxable_wage * ratio - coupon)
 
     @classmethod
     def get_tax_ratio(cls, month, net_taxable_wage):
-        assert 0 <= month < 12
-        for tax_ratio in cls.TAX_RATIO[month]:
-            if tax_ratio.min < net_taxable_wage <= tax_ratio.max:
-                return tax_ratio
-        return TaxRatio(0, 0, 0, 0)
+        """
+        :param month: 月份，从 0 开始
+        :param net_taxable_wage: 累计应纳税所得额
+        :return: （税率, 速算扣除数）
+        """
+        if not 0 <= month < 12:
+            raise ValueError('month {} out of range'.format(month))
+        if not 0 <= net_taxable_wage <= cls.TAX_RATIO_UPPER_BOUNDS[-1]:
+            raise ValueError('net_taxable_wage {} out of range'.format(net_taxable_wage))
+        i = bisect.bisect_left(cls.TAX_RATIO_UPPER_BOUNDS, net_taxable_wage)
+        return cls.TAX_RATIO_RATIOS[i], cls.TAX_RATIO_COUPONS[i]
 
 
 class SeparateAfterTaxWageCalculator:
@@ -228,7 +281,12 @@ class SeparateAfterTaxWageCalculator:
                  TaxRatio(25000, 35000, .25, 2660),
                  TaxRatio(35000, 55000, .3, 4410),
                  TaxRatio(55000, 80000, .35, 7160),
-                 TaxRatio(80000, sys.maxsize, .45, 15160)]
+                 TaxRatio(80000, math.inf, .45, 15160)]
+
+    # 税率表各级全月应纳税所得额上限、税率、速算扣除数，供 get_tax_ratio 二分查找
+    TAX_RATIO_UPPER_BOUNDS = tuple(tax_ratio.max for tax_ratio in TAX_RATIO)
+    TAX_RATIO_RATIOS = tuple(tax_ratio.ratio for tax_ratio in TAX_RATIO)
+    TAX_RATIO_COUPONS = tuple(tax_ratio.coupon for tax_ratio in TAX_RATIO)
 
     @classmethod
     def get_after_tax_wage(cls, taxable_wage):
@@ -236,17 +294,21 @@ class SeparateAfterTaxWageCalculator:
         :param taxable_wage: “所得项目小类”为“全年一次性奖金”、单独计税方式计算的应税收入
         :return: 税后工资
         """
-        tax_ratio = cls.get_tax_ratio(taxable_wage)
-        tax_amount = taxable_wage * tax_ratio.ratio - tax_ratio.coupon
+        ratio, coupon = cls.get_tax_ratio(taxable_wage)
+        tax_amount = taxable_wage * ratio - coupon
         return taxable_wage - tax_amount
 
     @classmethod
     def get_tax_ratio(cls, taxable_wage):
+        """
+        :param taxable_wage: “所得项目小类”为“全年一次性奖金”、单独计税方式计算的应税收入
+        :return: （税率, 速算扣除数）
+        """
         taxable_wage_per_month = taxable_wage / 12
-        for tax_ratio in cls.TAX_RATIO:
-            if tax_ratio.min < taxable_wage_per_month <= tax_ratio.max:
-                return tax_ratio
-        return TaxRatio(0, 0, 0, 0)
+        if not 0 <= taxable_wage_per_month <= cls.TAX_RATIO_UPPER_BOUNDS[-1]:
+            raise ValueError('taxable_wage {} out of range'.format(taxable_wage))
+        i = bisect.bisect_left(cls.TAX_RATIO_UPPER_BOUNDS, taxable_wage_per_month)
+        return cls.TAX_RATIO_RATIOS[i], cls.TAX_RATIO_COUPONS[i]
 
 
 if __name__ == '__main__':
@@ -285,18 +347,15 @@ if __name__ == '__main__':
     annual_one_time_bonus_multiplier = 1  # 全年一次性奖金 / 每月税前工资
     computed_gross_wage_per_month = 0
     computed_total_after_tax_wage = 0
-    while lo < hi:
+    while hi - lo > 0.01:
         computed_gross_wage_per_month = (hi - lo) / 2 + lo
-        gross_wages = [computed_gross_wage_per_month] * 12
-        taxable_wages = TaxableWageCalculator.get_taxable_wages(gross_wages, gross_wages, gross_wages)
-        after_tax_wages = AfterTaxWageCalculator.get_after_tax_wages(taxable_wages, taxable_wages)
-        computed_total_after_tax_wage = sum(after_tax_wages) + SeparateAfterTaxWageCalculator.get_after_tax_wage(
-            computed_gross_wage_per_month * annual_one_time_bonus_multiplier)
+        computed_total_after_tax_wage = (
+                AfterTaxWageCalculator.get_total_after_tax_wage(computed_gross_wage_per_month)
+                + SeparateAfterTaxWageCalculator.get_after_tax_wage(
+                    computed_gross_wage_per_month * annual_one_time_bonus_multiplier))
         if computed_total_after_tax_wage < actual_total_after_tax_wage:
-            lo += 1
-        elif computed_total_after_tax_wage > actual_total_after_tax_wage:
-            hi -= 1
+            lo = computed_gross_wage_per_month
         else:
-            break
+            hi = computed_gross_wage_per_month
     print(f"computed_gross_wage_per_month: {computed_gross_wage_per_month}")
     print(f"computed_total_after_tax_wage: {computed_total_after_tax_wage}")